@@ -5,20 +5,38 @@ Configuration-driven service that exposes REST endpoints for ingesting
 data into Databricks tables via Zerobus streams.
 """
 
-import json
+import asyncio
 import logging
 import os
+import time
 from contextlib import asynccontextmanager
+from functools import lru_cache
 from importlib import import_module
 from pathlib import Path
-from typing import Any, Dict
-
-from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
-from pydantic import create_model
+from typing import Any, Dict, List
+
+# Must be set before anything imports google.protobuf
+os.environ.setdefault("PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION", "upb")
+
+import msgspec  # noqa: E402
+import orjson  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+from fastapi import FastAPI, HTTPException, Request  # noqa: E402
+from fastapi.responses import Response  # noqa: E402
+from google.protobuf.internal import api_implementation  # noqa: E402
+
+from stream_manager import (  # noqa: E402
+    MAX_INFLIGHT_RECORDS,
+    InflightLimitError,
+    PartialIngestError,
+    StreamManager,
+)
 
-from stream_manager import StreamManager
+if api_implementation.Type() not in ("upb", "cpp"):
+    raise RuntimeError(
+        f"Native protobuf implementation required, got '{api_implementation.Type()}'. "
+        "Install protobuf>=4.21 and unset PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION."
+    )
 
 load_dotenv()
 
@@ -29,54 +47,205 @@ logger = logging.getLogger(__name__)
 
 stream_manager: StreamManager = None
 config: Dict = None
-table_models: Dict[str, Any] = {}
+message_classes: Dict[str, Any] = {}
+table_names: Dict[str, str] = {}
+record_decoders: Dict[str, msgspec.json.Decoder] = {}
+batch_decoders: Dict[str, msgspec.json.Decoder] = {}
+
+# Seconds each stream may take to open during startup before it is left for lazy creation
+STREAM_PREWARM_TIMEOUT = 10
+
+# Seconds between full tracebacks for the same (table, exception type)
+TRACEBACK_LOG_INTERVAL = 60
+_last_traceback: Dict[tuple, float] = {}
+
+# Config field type -> Python type; unknown types validate as str
+_TYPE_MAP = {
+    "string": str,
+    "int32": int,
+    "int64": int,
+    "float": float,
+    "double": float,
+    "bool": bool,
+}
+
+
+class OrjsonResponse(Response):
+    """JSON response encoded with orjson."""
 
+    media_type = "application/json"
 
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+@lru_cache(maxsize=1)
 def load_config() -> Dict:
     """Load configuration from config.json"""
     config_path = Path(__file__).parent / "config.json"
-    with open(config_path, "r") as f:
-        return json.load(f)
+    return orjson.loads(config_path.read_bytes())
 
 
-def create_pydantic_model(table_key: str, fields: list):
+def log_ingest_error(table_key: str, message: str, exc: Exception):
     """
-    Create a Pydantic model dynamically from field definitions.
+    Log an ingestion failure without formatting a traceback for every request.
+
+    The traceback is logged at most once per TRACEBACK_LOG_INTERVAL for each
+    (table, exception type); repeats in between get a one-line warning. A
+    PartialIngestError is keyed on the exception that caused it.
+
+    Args:
+        table_key: Table identifier
+        message: Short description of what failed
+        exc: The exception raised
+    """
+    cause = exc.__cause__ if isinstance(exc, PartialIngestError) else exc
+    key = (table_key, type(cause))
+    now = time.monotonic()
+    last = _last_traceback.get(key)
+    if last is None or now - last >= TRACEBACK_LOG_INTERVAL:
+        _last_traceback[key] = now
+        logger.error("%s into %s: %s", message, table_key, exc, exc_info=exc)
+    else:
+        logger.warning("%s into %s: %s", message, table_key, exc)
+
+
+def create_record_struct(table_key: str, fields: list):
+    """
+    Create a msgspec Struct dynamically from field definitions.
 
     Args:
         table_key: Unique table identifier
         fields: List of field definitions from config
 
     Returns:
-        Pydantic model class
+        msgspec Struct class
     """
-    field_definitions = {}
-    for field in fields:
-        field_name = field["name"]
-        field_type = field["type"]
-
-        type_map = {
-            "string": (str, ...),
-            "int32": (int, ...),
-            "int64": (int, ...),
-            "float": (float, ...),
-            "double": (float, ...),
-            "bool": (bool, ...),
-        }
+    field_definitions = [
+        (field["name"], _TYPE_MAP.get(field["type"], str)) for field in fields
+    ]
 
-        if field_type in type_map:
-            field_definitions[field_name] = type_map[field_type]
-        else:
-            field_definitions[field_name] = (str, ...)
+    struct_name = f"{table_key.title().replace('_', '')}Record"
+    return msgspec.defstruct(struct_name, field_definitions, forbid_unknown_fields=True)
+
+
+def to_message(table_key: str, data):
+    """
+    Build the table's protobuf message from a decoded record.
+
+    Args:
+        table_key: Unique table identifier
+        data: Decoded record struct
 
-    model_name = f"{table_key.title().replace('_', '')}Record"
-    return create_model(model_name, **field_definitions)
+    Returns:
+        Populated protobuf message
+    """
+    record = message_classes[table_key]()
+    for name in data.__struct_fields__:
+        setattr(record, name, getattr(data, name))
+    return record
+
+
+def document_request_bodies(app: FastAPI, record_structs: list):
+    """
+    Add the record schemas to the OpenAPI docs of the ingest endpoints.
+
+    The endpoints read the raw request body, so FastAPI can't infer a schema
+    for it; this fills one in from the msgspec structs built at startup.
+
+    Args:
+        app: The FastAPI application
+        record_structs: msgspec Struct classes, one per table
+    """
+    if not record_structs:
+        return
+
+    schemas = [
+        msgspec.json.schema(record_struct)["$defs"][record_struct.__name__]
+        for record_struct in record_structs
+    ]
+    record_schema = schemas[0] if len(schemas) == 1 else {"oneOf": schemas}
+    body_schemas = {
+        "/ingest/{table_key}": record_schema,
+        "/ingest/{table_key}/batch": {"type": "array", "items": record_schema},
+    }
+
+    for route in app.routes:
+        if getattr(route, "path", None) in body_schemas:
+            route.openapi_extra = {
+                "requestBody": {
+                    "required": True,
+                    "content": {
+                        "application/json": {"schema": body_schemas[route.path]}
+                    },
+                }
+            }
+    app.openapi_schema = None
+
+
+def build_record(table_key: str, body: bytes):
+    """
+    Decode and validate a JSON record into the table's protobuf message.
+
+    Args:
+        table_key: Unique table identifier
+        body: Raw JSON bytes for a single record
+
+    Returns:
+        Populated protobuf message
+
+    Raises:
+        HTTPException: 400 if the payload doesn't match the schema
+    """
+    try:
+        data = record_decoders[table_key].decode(body)
+        return to_message(table_key, data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+
+
+def build_records(table_key: str, body: bytes) -> list:
+    """
+    Decode and validate a JSON array of records into protobuf messages.
+
+    Args:
+        table_key: Unique table identifier
+        body: Raw JSON bytes for an array of records
+
+    Returns:
+        List of populated protobuf messages
+
+    Raises:
+        HTTPException: 400 if any record doesn't match the schema, 413 if the
+            batch could never fit within MAX_INFLIGHT_RECORDS
+    """
+    try:
+        items = batch_decoders[table_key].decode(body)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+
+    # Reject before building any messages so oversized batches stay cheap
+    if len(items) > MAX_INFLIGHT_RECORDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(items)} records exceeds the limit of {MAX_INFLIGHT_RECORDS}",
+        )
+
+    records = []
+    for index, item in enumerate(items):
+        try:
+            records.append(to_message(table_key, item))
+        except Exception as e:
+            raise HTTPException(
+                status_code=400, detail=f"Record {index}: Validation error: {str(e)}"
+            )
+    return records
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for FastAPI app."""
-    global stream_manager, config, table_models
+    global stream_manager, config, message_classes, table_names, record_decoders, batch_decoders
 
     logger.info("Starting Zerobus Station service...")
 
@@ -99,17 +268,66 @@ async def lifespan(app: FastAPI):
     )
     logger.info("✓ Stream manager initialized")
 
+    record_structs = []
     for table_key, table_config in config["tables"].items():
-        table_models[table_key] = create_pydantic_model(
-            table_key, table_config["fields"]
+        pb_module = import_module(f"tables.{table_key}.schema_pb2")
+        message_classes[table_key] = getattr(pb_module, table_config["message_name"])
+        table_names[table_key] = table_config["table_name"]
+        logger.info(f"✓ Loaded protobuf message for {table_key}")
+
+        record_struct = create_record_struct(table_key, table_config["fields"])
+        record_structs.append(record_struct)
+        # strict=False keeps the lax coercion clients relied on, e.g. "25" -> 25
+        record_decoders[table_key] = msgspec.json.Decoder(record_struct, strict=False)
+        batch_decoders[table_key] = msgspec.json.Decoder(
+            List[record_struct], strict=False
         )
-        logger.info(f"✓ Created validation model for {table_key}")
+        logger.info(f"✓ Created validation decoders for {table_key}")
+
+    document_request_bodies(app, record_structs)
+
+    stream_manager.register_tables(config["tables"].keys())
+    stream_manager.register_descriptors(
+        {
+            table_key: message_class.DESCRIPTOR
+            for table_key, message_class in message_classes.items()
+        }
+    )
+
+    # Open every stream up front so the first request per table doesn't pay
+    # for the OAuth and gRPC handshake. Failures and timeouts fall back to
+    # lazy creation, so a hung handshake can't stop the service from starting.
+    table_keys = list(config["tables"].keys())
+    results = await asyncio.gather(
+        *[
+            asyncio.wait_for(
+                stream_manager.get_stream(
+                    table_key=table_key,
+                    table_name=table_names[table_key],
+                ),
+                timeout=STREAM_PREWARM_TIMEOUT,
+            )
+            for table_key in table_keys
+        ],
+        return_exceptions=True,
+    )
+    for table_key, result in zip(table_keys, results):
+        if isinstance(result, asyncio.TimeoutError):
+            logger.warning(
+                f"Could not prewarm stream for {table_key}: "
+                f"timed out after {STREAM_PREWARM_TIMEOUT}s"
+            )
+        elif isinstance(result, BaseException):
+            logger.warning(f"Could not prewarm stream for {table_key}: {result!r}")
+        else:
+            logger.info(f"✓ Prewarmed stream for {table_key}")
 
     logger.info("=" * 60)
     logger.info("Zerobus Station is ready!")
     logger.info("Available endpoints:")
     for table_key in config["tables"].keys():
         logger.info(f"  POST /ingest/{table_key}")
+        logger.info(f"  POST /ingest/{table_key}/batch")
         logger.info(f"  GET  /health/{table_key}")
     logger.info("=" * 60)
 
@@ -126,6 +344,7 @@ app = FastAPI(
     description="Configuration-driven Databricks ingestion service using Zerobus",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=OrjsonResponse,
 )
 
 
@@ -139,6 +358,7 @@ async def root():
         "endpoints": {
             table_key: {
                 "ingest": f"/ingest/{table_key}",
+                "batch": f"/ingest/{table_key}/batch",
                 "health": f"/health/{table_key}",
             }
             for table_key in (config["tables"].keys() if config else [])
@@ -174,15 +394,16 @@ async def table_health(table_key: str):
 
 
 @app.post("/ingest/{table_key}")
-async def ingest_record(
-    table_key: str, body: Dict[str, Any], wait_for_ack: bool = False
-):
+async def ingest_record(table_key: str, request: Request, wait_for_ack: bool = False):
     """
     Ingest a record into the specified table.
 
+    The request body is decoded and validated in one pass by the table's
+    msgspec decoder, then copied into the protobuf message.
+
     Args:
         table_key: Table identifier (e.g., "station_one")
-        body: JSON payload matching the table schema
+        request: Request whose body is a JSON payload matching the table schema
         wait_for_ack: If True, waits for durability acknowledgment (default: False)
 
     Returns:
@@ -191,28 +412,14 @@ async def ingest_record(
     if not config or table_key not in config["tables"]:
         raise HTTPException(status_code=404, detail=f"Table {table_key} not found")
 
-    try:
-        model = table_models[table_key]
-        validated_data = model(**body)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
-
-    table_config = config["tables"][table_key]
+    record = build_record(table_key, await request.body())
 
     try:
         await stream_manager.get_stream(
             table_key=table_key,
-            table_name=table_config["table_name"],
-            proto_module=f"tables.{table_key}.schema_pb2",
-            message_name=table_config["message_name"],
+            table_name=table_names[table_key],
         )
 
-        pb_module = import_module(f"tables.{table_key}.schema_pb2")
-        message_class = getattr(pb_module, table_config["message_name"])
-
-        record_dict = validated_data.model_dump()
-        record = message_class(**record_dict)
-
         future = await stream_manager.ingest_record(table_key, record)
 
         if wait_for_ack:
@@ -225,13 +432,86 @@ async def ingest_record(
             "wait_for_ack": wait_for_ack,
         }
 
+    except InflightLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        logger.error(f"Error ingesting record into {table_key}: {e}", exc_info=True)
+        log_ingest_error(table_key, "Error ingesting record", e)
         raise HTTPException(
             status_code=500, detail=f"Failed to ingest record: {str(e)}"
         )
 
 
+@app.post("/ingest/{table_key}/batch")
+async def ingest_batch(table_key: str, request: Request, wait_for_ack: bool = False):
+    """
+    Ingest a batch of records into the specified table.
+
+    Every record is validated before any of them is sent, so a single invalid
+    record rejects the whole batch.
+
+    Args:
+        table_key: Table identifier (e.g., "station_one")
+        request: Request whose body is a JSON array of payloads matching the table schema
+        wait_for_ack: If True, waits for durability acknowledgment of every record (default: False)
+
+    Returns:
+        Acknowledgment of ingestion
+    """
+    if not config or table_key not in config["tables"]:
+        raise HTTPException(status_code=404, detail=f"Table {table_key} not found")
+
+    records = build_records(table_key, await request.body())
+
+    try:
+        await stream_manager.get_stream(
+            table_key=table_key,
+            table_name=table_names[table_key],
+        )
+
+        futures = await stream_manager.ingest_records(table_key, records)
+
+    except InflightLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except PartialIngestError as e:
+        # Some records are already in the stream; tell the client which ones
+        log_ingest_error(table_key, "Error ingesting batch", e)
+        raise HTTPException(
+            status_code=500,
+            detail=(
+                f"Failed to ingest batch: the first {e.accepted} of {e.total} records "
+                f"were accepted before the failure ({e.__cause__}); resend only the rest"
+            ),
+        )
+    except Exception as e:
+        log_ingest_error(table_key, "Error ingesting batch", e)
+        raise HTTPException(
+            status_code=500, detail=f"Failed to ingest batch: {str(e)}"
+        )
+
+    if wait_for_ack:
+        try:
+            await asyncio.gather(*futures)
+        except Exception as e:
+            # Every record is already in the stream, so a blind retry duplicates them
+            log_ingest_error(table_key, "Error acknowledging batch", e)
+            raise HTTPException(
+                status_code=500,
+                detail=(
+                    f"Failed to acknowledge batch: all {len(records)} records were sent "
+                    f"to the stream but acknowledgment failed ({e}); resending them may "
+                    f"create duplicates"
+                ),
+            )
+
+    return {
+        "status": "success",
+        "table": table_key,
+        "records": len(records),
+        "message": "Records ingested successfully",
+        "wait_for_ack": wait_for_ack,
+    }
+
+
 @app.post("/flush/{table_key}")
 async def flush_table(table_key: str):
     """
@@ -268,7 +548,7 @@ async def flush_table(table_key: str):
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return OrjsonResponse(
         status_code=exc.status_code,
         content={"error": exc.detail, "status_code": exc.status_code},
     )
@@ -277,6 +557,6 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return OrjsonResponse(
         status_code=500, content={"error": "Internal server error", "detail": str(exc)}
     )
@@ -7,21 +7,46 @@ Handles stream lifecycle, health checks, and graceful cleanup.
 
 import asyncio
 import logging
+from functools import partial
 from typing import Dict
-from importlib import import_module
 
 from zerobus.sdk.aio import ZerobusSdk
-from zerobus.sdk.shared import StreamConfigurationOptions, TableProperties
+from zerobus.sdk.shared import StreamConfigurationOptions, StreamState, TableProperties
 
 logger = logging.getLogger(__name__)
 
+# get_state() returns a StreamState; the strings cover SDK builds that report it as text
+_OPENED_STATES = frozenset({StreamState.OPENED, "OPENED", "StreamState.OPENED"})
+
+# Log every Nth acknowledged offset
+_ACK_LOG_INTERVAL = 10_000
+
+# Unacknowledged records allowed per table, in the SDK and on our side
+MAX_INFLIGHT_RECORDS = 50_000
+
+
+class InflightLimitError(Exception):
+    """Raised when a table has no room for more records awaiting acknowledgment."""
+
+
+class PartialIngestError(Exception):
+    """Raised when a batch fails after some of its records were handed to the stream."""
+
+    def __init__(self, accepted: int, total: int, cause: BaseException):
+        super().__init__(
+            f"{accepted} of {total} records were ingested before the batch failed: {cause}"
+        )
+        self.accepted = accepted
+        self.total = total
+
 
 class StreamManager:
     """
     Manages persistent Zerobus streams for multiple tables.
 
     Each table gets one persistent stream that is kept alive for performance.
-    Streams are created on-demand and cleaned up when no longer needed.
+    Streams are prewarmed at startup; any that couldn't be opened then, or that
+    later fail, are created on demand. All are cleaned up on shutdown.
     """
 
     def __init__(self, server_endpoint: str, workspace_id: str, workspace_url: str,
@@ -45,76 +70,134 @@ class StreamManager:
         # Initialize SDK with both host and Unity Catalog URL
         self.sdk = ZerobusSdk(host=server_endpoint, unity_catalog_url=workspace_url)
         self.streams: Dict[str, any] = {}
-        self._locks: Dict[str, asyncio.Lock] = {}
+        self._ready: Dict[str, asyncio.Event] = {}
+        self._creating: Dict[str, bool] = {}
+        self._inflight: Dict[str, int] = {}
+        self._descriptors: Dict[str, any] = {}
+
+    def register_tables(self, table_keys):
+        """
+        Create the per-table creation state up front so get_stream never has to.
+
+        Args:
+            table_keys: Keys of all configured tables
+        """
+        self._ready = {table_key: asyncio.Event() for table_key in table_keys}
+        self._creating = {table_key: False for table_key in table_keys}
+        self._inflight = {table_key: 0 for table_key in table_keys}
 
-    async def get_stream(self, table_key: str, table_name: str,
-                         proto_module: str, message_name: str):
+    def register_descriptors(self, descriptors: Dict[str, any]):
+        """
+        Register the protobuf message descriptor used to open each table's stream.
+
+        Args:
+            descriptors: Mapping of table key to message descriptor
+        """
+        self._descriptors = dict(descriptors)
+
+    async def get_stream(self, table_key: str, table_name: str):
         """
         Get or create a stream for a table.
 
         Args:
             table_key: Unique key for the table (e.g., "station_one")
             table_name: Fully qualified table name in Databricks
-            proto_module: Python module path for the protobuf (e.g., "tables.station_one.schema_pb2")
-            message_name: Name of the protobuf message (e.g., "StationOne")
 
         Returns:
             The Zerobus stream for this table
         """
-        if table_key not in self._locks:
-            self._locks[table_key] = asyncio.Lock()
+        ready = self._ready[table_key]
+        while True:
+            # Fast path: reuse an open stream
+            stream = self.streams.get(table_key)
+            if stream is not None and stream.get_state() in _OPENED_STATES:
+                return stream
+            if not self._creating[table_key]:
+                break
+            # Another request is (re)creating this stream; if it fails or is
+            # cancelled, loop round and try creating it ourselves
+            await ready.wait()
 
-        async with self._locks[table_key]:
-            if table_key in self.streams:
-                stream = self.streams[table_key]
-                state = stream.get_state()
-                if str(state) in ["OPENED", "StreamState.OPENED"]:
-                    return stream
-                else:
-                    logger.warning(f"Stream {table_key} is in state {state}, recreating...")
-                    await self._close_stream(table_key)
+        self._creating[table_key] = True
+        ready.clear()
+        try:
+            if stream is not None:
+                logger.warning(
+                    f"Stream {table_key} is in state {stream.get_state()}, recreating..."
+                )
+                await self._close_stream(table_key)
+            return await self._create_stream(table_key, table_name)
+        finally:
+            self._creating[table_key] = False
+            ready.set()
 
-            logger.info(f"Creating new stream for table {table_key} ({table_name})")
+    async def _create_stream(self, table_key: str, table_name: str):
+        """Open a new stream for a table and register it."""
+        logger.info(f"Creating new stream for table {table_key} ({table_name})")
 
-            try:
-                pb_module = import_module(proto_module)
-                message_class = getattr(pb_module, message_name)
-                descriptor = message_class.DESCRIPTOR
-            except (ImportError, AttributeError) as e:
-                logger.error(f"Failed to import protobuf for {table_key}: {e}")
-                raise
-
-            # Configure stream options
-            options = StreamConfigurationOptions(
-                max_inflight_records=50_000,
-                recovery=True,
-                ack_callback=self._create_ack_callback(table_key)
+        if table_key not in self._descriptors:
+            raise ValueError(f"No protobuf descriptor registered for table {table_key}")
+        descriptor = self._descriptors[table_key]
+
+        # Configure stream options
+        options = StreamConfigurationOptions(
+            max_inflight_records=MAX_INFLIGHT_RECORDS,
+            recovery=True,
+            ack_callback=partial(self._on_ack, table_key)
+        )
+
+        table_properties = TableProperties(table_name, descriptor)
+
+        try:
+            # create_stream now takes client_id and client_secret directly
+            stream = await self.sdk.create_stream(
+                self.client_id,
+                self.client_secret,
+                table_properties,
+                options
             )
+            self.streams[table_key] = stream
+            logger.info(f"✓ Stream created for {table_key}: {stream.stream_id}")
+            return stream
+        except Exception as e:
+            logger.error(f"Failed to create stream for {table_key}: {e}")
+            raise
 
-            table_properties = TableProperties(table_name, descriptor)
+    def _on_ack(self, table_key: str, response):
+        """Acknowledgment callback for a table's stream, bound per table with partial."""
+        offset = response.durability_ack_up_to_offset
+        if offset % _ACK_LOG_INTERVAL == 0 and logger.isEnabledFor(logging.INFO):
+            logger.info("[%s] Acknowledged up to offset: %d", table_key, offset)
 
-            try:
-                # create_stream now takes client_id and client_secret directly
-                stream = await self.sdk.create_stream(
-                    self.client_id,
-                    self.client_secret,
-                    table_properties,
-                    options
-                )
-                self.streams[table_key] = stream
-                logger.info(f"✓ Stream created for {table_key}: {stream.stream_id}")
-                return stream
-            except Exception as e:
-                logger.error(f"Failed to create stream for {table_key}: {e}")
-                raise
+    def _reserve(self, table_key: str, count: int):
+        """Reserve in-flight capacity, rejecting instead of queueing so backpressure reaches the client."""
+        if self._inflight[table_key] + count > MAX_INFLIGHT_RECORDS:
+            raise InflightLimitError(
+                f"Table {table_key} has {self._inflight[table_key]} of {MAX_INFLIGHT_RECORDS} "
+                f"records awaiting acknowledgment, no room for {count} more"
+            )
+        self._inflight[table_key] += count
 
-    def _create_ack_callback(self, table_key: str):
-        """Create an acknowledgment callback for a specific table."""
-        def callback(response):
-            offset = response.durability_ack_up_to_offset
-            if offset % 1000 == 0:
-                logger.info(f"[{table_key}] Acknowledged up to offset: {offset}")
-        return callback
+    def _release(self, table_key: str, stream, count: int = 1):
+        """
+        Give back in-flight capacity taken by _reserve.
+
+        The count belongs to the table's current stream; releases for a stream
+        that has since been closed or replaced are ignored, because closing it
+        already reset the count.
+        """
+        if self.streams.get(table_key) is stream:
+            self._inflight[table_key] -= count
+
+    async def _submit(self, table_key: str, stream, record):
+        """Hand one reserved record to the stream; its capacity is released on acknowledgment."""
+        try:
+            future = await stream.ingest_record(record)
+        except BaseException:
+            self._release(table_key, stream)
+            raise
+        future.add_done_callback(lambda _: self._release(table_key, stream))
+        return future
 
     async def ingest_record(self, table_key: str, record):
         """
@@ -126,13 +209,52 @@ class StreamManager:
 
         Returns:
             Future that resolves when record is acknowledged
+
+        Raises:
+            InflightLimitError: If the table is at its in-flight limit
         """
         if table_key not in self.streams:
             raise ValueError(f"No stream available for table {table_key}")
 
+        self._reserve(table_key, 1)
+        return await self._submit(table_key, self.streams[table_key], record)
+
+    async def ingest_records(self, table_key: str, records: list) -> list:
+        """
+        Ingest a batch of records into the specified table's stream.
+
+        Capacity for the whole batch is reserved before anything is sent, so a
+        batch is either rejected up front or handed to the stream in full.
+
+        Args:
+            table_key: Table identifier
+            records: Protobuf messages to ingest
+
+        Returns:
+            Futures that resolve when each record is acknowledged
+
+        Raises:
+            InflightLimitError: If the table can't take the whole batch right now
+            PartialIngestError: If the stream fails after accepting part of the batch
+        """
+        if table_key not in self.streams:
+            raise ValueError(f"No stream available for table {table_key}")
+
+        self._reserve(table_key, len(records))
+
         stream = self.streams[table_key]
-        future = await stream.ingest_record(record)
-        return future
+        futures = []
+        try:
+            for record in records:
+                futures.append(await self._submit(table_key, stream, record))
+        except Exception as e:
+            raise PartialIngestError(len(futures), len(records), e) from e
+        finally:
+            # _submit releases the record it failed on; give back the unsent rest
+            unsent = len(records) - len(futures) - 1
+            if unsent > 0:
+                self._release(table_key, stream, unsent)
+        return futures
 
     async def _close_stream(self, table_key: str):
         """Close a specific stream."""
@@ -145,6 +267,8 @@ class StreamManager:
                 logger.error(f"Error closing stream for {table_key}: {e}")
             finally:
                 del self.streams[table_key]
+                # Records still pending on the dropped stream no longer count
+                self._inflight[table_key] = 0
 
     async def close_all(self):
         """Close all active streams gracefully."""